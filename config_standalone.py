@@ -5,6 +5,8 @@ Update these paths according to your system setup.
 """
 
 import os
+import shutil
+from functools import lru_cache
 
 # =============================================================================
 # OCR CONFIGURATION
@@ -29,11 +31,19 @@ POPPLER_PATH = r'C:\Users\prash\Downloads\Release-23.11.0-0\poppler-23.11.0\Libr
 # OCR Settings
 OCR_DPI = 300  # Higher DPI = better quality but slower processing
 OCR_CONFIG = "--psm 6"  # Page segmentation mode
+OCR_PREPROCESS = True  # Binarize page images with an adaptive threshold before OCR
+OCR_LANG = "eng"  # Tesseract language(s), e.g. "eng+deu"
+OCR_CACHE_DIR = None  # Private directory to keep OCR text between runs (created 0700); None = in-memory cache only
+OCR_MIN_CONFIDENCE = 60  # Pages below this mean word confidence are retried with other PSMs
 
 # Text extraction settings
 MIN_TEXT_LENGTH = 50  # Minimum characters to consider as text-based PDF
 MIN_LINE_LENGTH = 2   # Minimum characters for a line to be included
 
+# Parallel processing settings
+NUM_WORKERS = min(os.cpu_count() or 1, 4)  # Worker processes for page extraction (1 = sequential)
+PARALLEL_MIN_PAGES = 8  # Smaller PDFs are processed sequentially to avoid pool startup cost
+
 # =============================================================================
 # OUTPUT CONFIGURATION
 # =============================================================================
@@ -41,33 +51,42 @@ MIN_LINE_LENGTH = 2   # Minimum characters for a line to be included
 # Default output settings
 DEFAULT_OUTPUT_DIR = "output"
 INCLUDE_HEADERS = False  # Set to True to include column headers in Excel
+INCLUDE_RAW_DATA_SHEET = False  # Set to True to add the Raw_Data debugging sheet (duplicates All_Text_Content)
 
 # =============================================================================
 # VALIDATION FUNCTIONS
 # =============================================================================
 
+# Common Tesseract install locations, probed when TESSERACT_PATH is not valid
+ALTERNATIVE_TESSERACT_PATHS = (
+    r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+    r".\tesseract\tesseract.exe",
+    "/usr/bin/tesseract",
+    "/usr/local/bin/tesseract"
+)
+
+@lru_cache(maxsize=1)
 def validate_tesseract_path():
-    """Check if Tesseract is available at the configured path."""
-    if os.path.exists(TESSERACT_PATH):
+    """Check if Tesseract is available at the configured path (cached)."""
+    if os.path.isfile(TESSERACT_PATH):
         return True, TESSERACT_PATH
     
-    # Try common alternative paths
-    alternative_paths = [
-        r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-        r".\tesseract\tesseract.exe",
-        "/usr/bin/tesseract",
-        "/usr/local/bin/tesseract"
-    ]
+    # Cheap PATH lookup before probing the hardcoded locations
+    path_in_env = shutil.which('tesseract')
+    if path_in_env:
+        return True, path_in_env
     
-    for path in alternative_paths:
-        if os.path.exists(path):
+    # Try common alternative paths
+    for path in ALTERNATIVE_TESSERACT_PATHS:
+        if os.path.isfile(path):
             return True, path
     
     return False, None
 
+@lru_cache(maxsize=1)
 def validate_poppler_path():
-    """Check if Poppler is available at the configured path."""
-    if os.path.exists(POPPLER_PATH):
+    """Check if Poppler is available at the configured path (cached)."""
+    if os.path.isdir(POPPLER_PATH):
         return True, POPPLER_PATH
     
     # On Linux/macOS, poppler-utils might be in PATH
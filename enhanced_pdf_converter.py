@@ -6,12 +6,19 @@ Advanced converter that preserves all data without truncation and handles tables
 
 import os
 import pdfplumber
-import pytesseract
-from pdf2image import convert_from_path
 import pandas as pd
+import numpy as np
 import sys
 import re
-from typing import List, Dict, Any, Tuple
+import shutil
+import tempfile
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterator, Tuple, Union, BinaryIO
 import logging
 
 # Configure logging
@@ -22,7 +29,8 @@ logger = logging.getLogger(__name__)
 try:
     from config_standalone import (
         TESSERACT_PATH, POPPLER_PATH, OCR_DPI, OCR_CONFIG,
-        MIN_TEXT_LENGTH, MIN_LINE_LENGTH, validate_tesseract_path
+        OCR_PREPROCESS, OCR_LANG, OCR_CACHE_DIR, OCR_MIN_CONFIDENCE, MIN_TEXT_LENGTH, MIN_LINE_LENGTH,
+        NUM_WORKERS, PARALLEL_MIN_PAGES, INCLUDE_RAW_DATA_SHEET, validate_tesseract_path
     )
 except ImportError:
     # Fallback configuration
@@ -30,26 +38,44 @@ except ImportError:
     POPPLER_PATH = r'C:\path\to\poppler\bin'
     OCR_DPI = 300
     OCR_CONFIG = "--psm 6"
+    OCR_PREPROCESS = True
+    OCR_LANG = "eng"
+    OCR_CACHE_DIR = None
+    OCR_MIN_CONFIDENCE = 60
     MIN_TEXT_LENGTH = 50
     MIN_LINE_LENGTH = 2
+    NUM_WORKERS = min(os.cpu_count() or 1, 4)
+    PARALLEL_MIN_PAGES = 8
+    INCLUDE_RAW_DATA_SHEET = False
     
+    @lru_cache(maxsize=1)
     def validate_tesseract_path():
-        possible_paths = [
-            TESSERACT_PATH,
+        if os.path.exists(TESSERACT_PATH):
+            return True, TESSERACT_PATH
+        
+        path_in_env = shutil.which('tesseract')
+        if path_in_env:
+            return True, path_in_env
+        
+        possible_paths = (
             r"C:\Program Files\Tesseract-OCR\tesseract.exe",
             r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
             r".\tesseract\tesseract.exe",
             "/usr/bin/tesseract",
             "/usr/local/bin/tesseract"
-        ]
+        )
         
         for path in possible_paths:
             if os.path.exists(path):
                 return True, path
         return False, None
 
+@lru_cache(maxsize=1)
 def setup_tesseract():
-    """Setup Tesseract OCR path with enhanced configuration"""
+    """Setup Tesseract OCR path with enhanced configuration (checked once per process)"""
+    # OCR dependencies are imported lazily so text-based conversions don't pay for them
+    import pytesseract
+    
     tesseract_ok, tesseract_path = validate_tesseract_path()
     if tesseract_ok:
         pytesseract.pytesseract.tesseract_cmd = tesseract_path
@@ -59,18 +85,28 @@ def setup_tesseract():
     logger.warning("⚠️ Tesseract not found. OCR functionality will be disabled.")
     return False
 
+def has_extractable_text(pdf) -> bool:
+    """Check if an opened pdfplumber PDF contains extractable text"""
+    try:
+        # Count non-whitespace characters straight from the parsed page objects
+        # instead of running layout analysis, and stop once the threshold is met
+        total_text_length = 0
+        for page in pdf.pages:
+            total_text_length += sum(1 for char in page.chars if not char['text'].isspace())
+            
+            # More lenient threshold for text detection
+            if total_text_length > MIN_TEXT_LENGTH:
+                return True
+        return False
+    except Exception as e:
+        logger.error(f"Error checking PDF type: {e}")
+        return False
+
 def is_text_based(pdf_path: str) -> bool:
     """Enhanced check if PDF contains extractable text"""
     try:
         with pdfplumber.open(pdf_path) as pdf:
-            total_text_length = 0
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    total_text_length += len(text.strip())
-            
-            # More lenient threshold for text detection
-            return total_text_length > MIN_TEXT_LENGTH
+            return has_extractable_text(pdf)
     except Exception as e:
         logger.error(f"Error checking PDF type: {e}")
         return False
@@ -88,23 +124,10 @@ def extract_tables_enhanced(page) -> List[List[List[str]]]:
         })
         
         for table in extracted_tables:
-            if table and len(table) > 0:
-                # Clean and validate table data
-                cleaned_table = []
-                for row in table:
-                    cleaned_row = []
-                    for cell in row:
-                        if cell is not None:
-                            # Preserve full cell content without truncation
-                            cell_text = str(cell).strip()
-                            if cell_text:
-                                cleaned_row.append(cell_text)
-                            else:
-                                cleaned_row.append("")
-                        else:
-                            cleaned_row.append("")
-                    if any(cell for cell in cleaned_row):  # Only add non-empty rows
-                        cleaned_table.append(cleaned_row)
+            if table:
+                # Clean and validate table data, preserving full cell content without truncation
+                cleaned_table = [["" if cell is None else str(cell).strip() for cell in row] for row in table]
+                cleaned_table = [row for row in cleaned_table if any(row)]  # Only keep non-empty rows
                 
                 if cleaned_table:
                     tables.append(cleaned_table)
@@ -126,57 +149,86 @@ def extract_text_enhanced(page) -> List[str]:
             use_text_flow=True
         )
         
-        if words:
-            # Group words by line based on y-position
-            current_line = []
-            current_y = None
-            
-            for word in words:
-                word_text = word.get('text', '').strip()
-                word_y = word.get('top', 0)
-                
-                if not word_text:
-                    continue
-                
-                # Check if this word belongs to the same line
-                if current_y is None or abs(word_y - current_y) < 10:
-                    current_line.append(word_text)
-                    current_y = word_y
-                else:
-                    # New line detected
-                    if current_line:
-                        full_line = ' '.join(current_line)
-                        if len(full_line.strip()) >= MIN_LINE_LENGTH:
-                            lines.append(full_line.strip())
-                    current_line = [word_text]
-                    current_y = word_y
-            
-            # Don't forget the last line
-            if current_line:
-                full_line = ' '.join(current_line)
-                if len(full_line.strip()) >= MIN_LINE_LENGTH:
-                    lines.append(full_line.strip())
+        # Group words by line based on y-position: a new line starts wherever a
+        # word sits 10pt or more above/below the previous word
+        word_texts = [word.get('text', '').strip() for word in words]
+        tops = np.fromiter(
+            (word.get('top', 0) for word, text in zip(words, word_texts) if text), dtype=np.float64
+        )
+        word_texts = [text for text in word_texts if text]
+        
+        if word_texts:
+            breaks = (np.flatnonzero(np.abs(np.diff(tops)) >= 10) + 1).tolist()
+            for start, end in zip([0] + breaks, breaks + [len(word_texts)]):
+                full_line = ' '.join(word_texts[start:end])
+                if len(full_line) >= MIN_LINE_LENGTH:
+                    lines.append(full_line)
         
-        # Fallback to simple text extraction if word extraction fails
-        if not lines:
-            text = page.extract_text()
-            if text:
-                lines = [line.strip() for line in text.split('\n') if line.strip() and len(line.strip()) >= MIN_LINE_LENGTH]
-                
     except Exception as e:
         logger.warning(f"Error extracting text: {e}")
-        # Final fallback
+    
+    # Fallback to simple text extraction if word extraction failed or found nothing;
+    # this is the only extract_text() call, so the page layout is analysed once
+    if not lines:
         try:
             text = page.extract_text()
             if text:
                 lines = [line.strip() for line in text.split('\n') if line.strip() and len(line.strip()) >= MIN_LINE_LENGTH]
-        except:
+        except Exception:
             pass
     
     return lines
 
-def extract_content_pdfplumber_enhanced(pdf_path: str) -> Dict[str, Any]:
-    """Enhanced content extraction using pdfplumber"""
+def extract_page_content(page, include_tables: bool = True) -> Tuple[List[List[List[str]]], List[str]]:
+    """Extract tables (unless disabled) and text lines from a single pdfplumber page"""
+    # Table detection is the costliest part of a page; skip it when tables aren't wanted
+    tables = extract_tables_enhanced(page) if include_tables else []
+    return tables, extract_text_enhanced(page)
+
+def _iter_page_content(pages, include_tables: bool = True) -> Iterator[Tuple[List[List[List[str]]], List[str]]]:
+    """Yield each page's content, releasing the page's parsed objects once it is extracted"""
+    for page in pages:
+        try:
+            yield extract_page_content(page, include_tables)
+        finally:
+            # pdfplumber caches chars/layout per page for the lifetime of the handle;
+            # Page.close() only exists from 0.10.4, older releases have flush_cache()
+            close = getattr(page, 'close', None) or getattr(page, 'flush_cache', None)
+            if close is not None:
+                close()
+
+# Worker pools start with spawn rather than the POSIX default fork: the converter runs
+# inside Streamlit's multi-threaded server, and a forked child can inherit a lock
+# (logging, pdfium, the OCR cache) held by another thread and deadlock on it
+_POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+def _extract_page_range(pdf_path: str, first_page: int, last_page: int,
+                        include_tables: bool = True) -> List[Tuple[List[List[List[str]]], List[str]]]:
+    """Process-pool worker: open the PDF once and extract a contiguous range of pages"""
+    with pdfplumber.open(pdf_path, pages=list(range(first_page, last_page + 1))) as pdf:
+        return list(_iter_page_content(pdf.pages, include_tables))
+
+def _extract_pages_parallel(pdf_path: str, total_pages: int, num_workers: int,
+                            include_tables: bool = True) -> List[Tuple[List[List[List[str]]], List[str]]]:
+    """Split the document into one page range per worker and extract them concurrently"""
+    chunk_size = -(-total_pages // num_workers)  # ceiling division
+    first_pages = list(range(1, total_pages + 1, chunk_size))
+    last_pages = [min(first + chunk_size - 1, total_pages) for first in first_pages]
+    
+    logger.info(f"⚡ Extracting {total_pages} pages with {len(first_pages)} worker processes...")
+    with ProcessPoolExecutor(max_workers=len(first_pages), mp_context=_POOL_CONTEXT) as executor:
+        chunks = executor.map(_extract_page_range, [pdf_path] * len(first_pages), first_pages, last_pages,
+                              [include_tables] * len(first_pages))
+        return [page_result for chunk in chunks for page_result in chunk]
+
+def extract_content_from_pdf(pdf, pdf_path: str = None, num_workers: int = 1,
+                             include_tables: bool = True) -> Dict[str, Any]:
+    """Enhanced content extraction from an opened pdfplumber PDF
+    
+    When pdf_path is given and the document has at least PARALLEL_MIN_PAGES pages,
+    pages are split across num_workers processes instead of reusing the open handle.
+    With include_tables=False, table detection is skipped and only text is extracted.
+    """
     logger.info("📄 Extracting content using enhanced pdfplumber...")
     
     all_tables = []
@@ -184,49 +236,56 @@ def extract_content_pdfplumber_enhanced(pdf_path: str) -> Dict[str, Any]:
     page_info = []
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                logger.info(f"🔄 Processing page {page_num}/{len(pdf.pages)}...")
-                
-                page_data = {
-                    'page_number': page_num,
-                    'tables': [],
-                    'text_lines': [],
-                    'has_content': False
-                }
-                
-                # Extract tables first
-                tables = extract_tables_enhanced(page)
-                if tables:
-                    logger.info(f"📊 Found {len(tables)} table(s) on page {page_num}")
-                    for table_idx, table in enumerate(tables):
-                        table_info = {
-                            'page': page_num,
-                            'table_index': table_idx,
-                            'rows': len(table),
-                            'columns': len(table[0]) if table else 0,
-                            'data': table
-                        }
-                        all_tables.append(table_info)
-                        page_data['tables'].append(table_info)
-                        page_data['has_content'] = True
-                
-                # Extract text if no tables or as supplementary content
-                text_lines = extract_text_enhanced(page)
-                if text_lines:
-                    logger.info(f"📝 Extracted {len(text_lines)} text lines from page {page_num}")
-                    for line_idx, line in enumerate(text_lines, 1):
-                        text_info = {
-                            'page': page_num,
-                            'line_number': line_idx,
-                            'content': line,
-                            'type': 'text'
-                        }
-                        all_text.append(text_info)
-                        page_data['text_lines'].append(text_info)
-                        page_data['has_content'] = True
-                
-                page_info.append(page_data)
+        total_pages = len(pdf.pages)
+        page_results = None
+        if pdf_path and num_workers > 1 and total_pages >= PARALLEL_MIN_PAGES:
+            try:
+                page_results = _extract_pages_parallel(pdf_path, total_pages, num_workers, include_tables)
+            except Exception as e:
+                logger.warning(f"⚠️ Parallel extraction failed, processing pages sequentially: {e}")
+        if page_results is None:
+            page_results = _iter_page_content(pdf.pages, include_tables)
+        
+        for page_num, (tables, text_lines) in enumerate(page_results, 1):
+            logger.info(f"🔄 Processing page {page_num}/{total_pages}...")
+            
+            page_data = {
+                'page_number': page_num,
+                'tables': [],
+                'text_lines': [],
+                'has_content': False
+            }
+            
+            # Tables first
+            if tables:
+                logger.info(f"📊 Found {len(tables)} table(s) on page {page_num}")
+                for table_idx, table in enumerate(tables):
+                    table_info = {
+                        'page': page_num,
+                        'table_index': table_idx,
+                        'rows': len(table),
+                        'columns': len(table[0]) if table else 0,
+                        'data': table
+                    }
+                    all_tables.append(table_info)
+                    page_data['tables'].append(table_info)
+                    page_data['has_content'] = True
+            
+            # Text lines as supplementary content
+            if text_lines:
+                logger.info(f"📝 Extracted {len(text_lines)} text lines from page {page_num}")
+                for line_idx, line in enumerate(text_lines, 1):
+                    text_info = {
+                        'page': page_num,
+                        'line_number': line_idx,
+                        'content': line,
+                        'type': 'text'
+                    }
+                    all_text.append(text_info)
+                    page_data['text_lines'].append(text_info)
+                    page_data['has_content'] = True
+            
+            page_info.append(page_data)
         
         if not all_tables and not all_text:
             logger.warning("⚠️ No content extracted with pdfplumber")
@@ -243,76 +302,428 @@ def extract_content_pdfplumber_enhanced(pdf_path: str) -> Dict[str, Any]:
         logger.error(f"❌ Error extracting with pdfplumber: {e}")
         return {'tables': [], 'text': [], 'pages': []}
 
-def extract_text_ocr_enhanced(pdf_path: str) -> Dict[str, Any]:
-    """Enhanced OCR extraction with better accuracy"""
+def extract_content_pdfplumber_enhanced(pdf_path: str, num_workers: int = NUM_WORKERS,
+                                        include_tables: bool = True) -> Dict[str, Any]:
+    """Enhanced content extraction using pdfplumber"""
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            return extract_content_from_pdf(pdf, pdf_path, num_workers, include_tables)
+    except Exception as e:
+        logger.error(f"❌ Error extracting with pdfplumber: {e}")
+        return {'tables': [], 'text': [], 'pages': []}
+
+# Fully automatic page segmentation runs first; pages it reads with a mean word
+# confidence below OCR_MIN_CONFIDENCE are retried with these modes and the
+# longest result wins
+OCR_PRIMARY_CONFIG = "--psm 3"  # Fully automatic page segmentation
+OCR_RETRY_CONFIGS = (
+    "--psm 6",  # Uniform block of text
+    "--psm 4"   # Assume a single column of text
+)
+
+def _preprocess_for_ocr(img):
+    """Convert a page image to grayscale and binarize it with an adaptive threshold"""
+    from PIL import Image, ImageFilter
+    
+    gray = img.convert("L")
+    if not OCR_PREPROCESS:
+        return gray
+    
+    # Gaussian adaptive threshold: a pixel is ink if it is darker than its local
+    # neighbourhood mean by more than a small offset, which removes uneven
+    # backgrounds and scan shadows that a global threshold would keep
+    pixels = np.asarray(gray, dtype=np.int16)
+    local_mean = np.asarray(gray.filter(ImageFilter.GaussianBlur(radius=5)), dtype=np.int16)
+    binary = np.where(pixels > local_mean - 10, 255, 0).astype(np.uint8)
+    return Image.fromarray(binary, mode="L")
+
+def _ocr_with_config(list_path: str, image_paths: List[str], config: str) -> List[str]:
+    """Run one batched Tesseract pass over a page list, falling back to per-page runs"""
+    import pytesseract
+    
+    try:
+        page_texts = pytesseract.image_to_string(list_path, lang=OCR_LANG, config=config).split('\f')
+        if len(page_texts) >= len(image_paths):
+            return page_texts[:len(image_paths)]
+    except Exception:
+        pass
+    
+    texts = []
+    for image_path in image_paths:
+        try:
+            texts.append(pytesseract.image_to_string(image_path, lang=OCR_LANG, config=config))
+        except Exception:
+            texts.append("")
+    return texts
+
+def _pages_from_ocr_data(data: Dict[str, list], page_count: int) -> List[Tuple[str, float]]:
+    """Rebuild (text, mean word confidence) per page from image_to_data output"""
+    page_lines = [{} for _ in range(page_count)]
+    page_confs = [[] for _ in range(page_count)]
+    for page_num, block_num, par_num, line_num, conf, text in zip(
+            data['page_num'], data['block_num'], data['par_num'],
+            data['line_num'], data['conf'], data['text']):
+        text = str(text).strip()
+        if not text or float(conf) < 0:
+            continue
+        page_lines[page_num - 1].setdefault((block_num, par_num, line_num), []).append(text)
+        page_confs[page_num - 1].append(float(conf))
+    
+    return [
+        ('\n'.join(' '.join(words) for words in lines.values()), sum(confs) / len(confs) if confs else 0.0)
+        for lines, confs in zip(page_lines, page_confs)
+    ]
+
+def _ocr_data_with_config(list_path: str, image_paths: List[str], config: str) -> List[Tuple[str, float]]:
+    """Run one batched image_to_data pass over a page list, falling back to per-page runs"""
+    import pytesseract
+    
+    try:
+        data = pytesseract.image_to_data(list_path, lang=OCR_LANG, config=config, output_type=pytesseract.Output.DICT)
+        if max(data['page_num'], default=0) <= len(image_paths):
+            return _pages_from_ocr_data(data, len(image_paths))
+    except Exception:
+        pass
+    
+    pages = []
+    for image_path in image_paths:
+        try:
+            data = pytesseract.image_to_data(image_path, lang=OCR_LANG, config=config, output_type=pytesseract.Output.DICT)
+            pages.extend(_pages_from_ocr_data(data, 1))
+        except Exception:
+            pages.append(("", 0.0))
+    return pages
+
+def _write_page_list(image_paths: List[str]) -> str:
+    """Write a Tesseract file list next to the first page image and return its path"""
+    list_path = f"{os.path.splitext(image_paths[0])[0]}_pages.txt"
+    with open(list_path, 'w') as f:
+        f.write('\n'.join(image_paths) + '\n')
+    return list_path
+
+# OCR results of already-seen page images, keyed by _ocr_cache_key (per process);
+# least recently used entries are dropped so long-lived servers stay bounded
+_OCR_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_OCR_CACHE_MAX_ENTRIES = 1024
+# Streamlit runs each session in its own thread, so LRU updates must not interleave
+_OCR_CACHE_LOCK = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _tesseract_version(tesseract_cmd: str) -> str:
+    """Return the Tesseract version string for the cache key (checked once per command)"""
+    import pytesseract
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        return "unknown"
+
+def _ocr_cache_key(img, tesseract_cmd: str) -> str:
+    """Hash a preprocessed page image together with the OCR engine and settings applied to it"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{_tesseract_version(tesseract_cmd)}{OCR_LANG}{img.mode}{img.size}"
+                  f"{OCR_PRIMARY_CONFIG}{OCR_RETRY_CONFIGS}{OCR_MIN_CONFIDENCE}".encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+def _remember_ocr_text(key: str, text: str) -> None:
+    """Add OCR text to the in-memory cache, evicting the least recently used entry"""
+    with _OCR_CACHE_LOCK:
+        _OCR_CACHE[key] = text
+        _OCR_CACHE.move_to_end(key)
+        if len(_OCR_CACHE) > _OCR_CACHE_MAX_ENTRIES:
+            _OCR_CACHE.popitem(last=False)
+
+def _read_ocr_cache(key: str):
+    """Look up cached OCR text in memory, then in OCR_CACHE_DIR"""
+    with _OCR_CACHE_LOCK:
+        if key in _OCR_CACHE:
+            _OCR_CACHE.move_to_end(key)
+            return _OCR_CACHE[key]
+    if OCR_CACHE_DIR:
+        try:
+            with open(os.path.join(OCR_CACHE_DIR, f"{key}.txt"), encoding='utf-8') as f:
+                text = f.read()
+            if text.strip():
+                _remember_ocr_text(key, text)
+                return text
+        except (OSError, ValueError):
+            # Missing, unreadable or corrupt (not UTF-8) entries count as a miss
+            pass
+    return None
+
+def _write_ocr_cache(key: str, text: str) -> None:
+    """Store OCR text in memory and, when configured, in OCR_CACHE_DIR
+    
+    Empty results are never stored: they are what a failed Tesseract run returns,
+    and caching them would hide the page's text from every later run.
+    """
+    if not text.strip():
+        return
+    _remember_ocr_text(key, text)
+    if OCR_CACHE_DIR:
+        try:
+            # Cached text is document content, so keep it private to the current user
+            os.makedirs(OCR_CACHE_DIR, mode=0o700, exist_ok=True)
+            fd = os.open(os.path.join(OCR_CACHE_DIR, f"{key}.txt"), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+        except OSError as e:
+            logger.debug(f"OCR cache write failed: {e}")
+
+def _ocr_page_batch(pdf_path: str, pages: List[Tuple[int, str]], dpi: int,
+                    tesseract_cmd: str) -> List[Tuple[int, str]]:
+    """OCR (page_number, image_path) pages rendered at dpi and return (page_number, best text)
+    
+    A page whose image can't be loaded or preprocessed is logged and left out, so
+    one bad page doesn't cost the rest of the batch. Picklable for process pools.
+    """
+    import pytesseract
+    from PIL import Image
+    
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    
+    # Preprocess in place so Tesseract reads the cleaned pages straight from disk;
+    # pages seen before (this run or a previous one) are answered from the cache
+    page_keys = []
+    results = {}
+    pending = {}
+    for page_num, image_path in pages:
+        try:
+            with Image.open(image_path) as img:
+                processed = _preprocess_for_ocr(img)
+            key = _ocr_cache_key(processed, tesseract_cmd)
+            if key not in results and key not in pending:
+                cached = _read_ocr_cache(key)
+                if cached is not None:
+                    results[key] = cached
+                else:
+                    processed.save(image_path)
+                    pending[key] = (image_path, page_num)
+            # Recorded only once the page is answered or queued, so a failure
+            # above leaves no key behind without a result
+            page_keys.append((page_num, key))
+        except Exception as e:
+            logger.warning(f"⚠️ OCR failed on page {page_num}: {e}")
+    
+    if pending:
+        pending_paths = [image_path for image_path, _ in pending.values()]
+        pending_pages = [page_num for _, page_num in pending.values()]
+        
+        # A file list lets a single Tesseract process (and model load) handle every
+        # page per config; one data pass gives both the text and its confidence
+        first_pass = _ocr_data_with_config(_write_page_list(pending_paths), pending_paths, OCR_PRIMARY_CONFIG)
+        best_texts = [text for text, _ in first_pass]
+        
+        # Only pages read with low confidence pay for a higher-DPI render and the
+        # other segmentation modes; a page that fails to re-render keeps its first pass
+        retry = []
+        retry_paths = []
+        for idx, (_, conf) in enumerate(first_pass):
+            if conf >= OCR_MIN_CONFIDENCE:
+                continue
+            page_num = pending_pages[idx]
+            try:
+                rendered = _render_pages(pdf_path, dpi + 100, os.path.dirname(pending_paths[idx]),
+                                         1, page_num, page_num)
+                if not rendered:
+                    continue
+                retry_path = rendered[0][1]
+                with Image.open(retry_path) as img:
+                    processed = _preprocess_for_ocr(img)
+                processed.save(retry_path)
+            except Exception as e:
+                logger.warning(f"⚠️ OCR retry failed on page {page_num}: {e}")
+                continue
+            retry.append(idx)
+            retry_paths.append(retry_path)
+        if retry:
+            retry_list = _write_page_list(retry_paths)
+            for config in OCR_RETRY_CONFIGS:
+                for idx, text in zip(retry, _ocr_with_config(retry_list, retry_paths, config)):
+                    if len(text.strip()) > len(best_texts[idx].strip()):
+                        best_texts[idx] = text
+        
+        for key, text in zip(pending, best_texts):
+            results[key] = text
+            _write_ocr_cache(key, text)
+    
+    return [(page_num, results[key]) for page_num, key in page_keys if key in results]
+
+def _render_pages(pdf_path: str, dpi: int, output_folder: str, thread_count: int = 1,
+                  first_page: int = 1, last_page: int = None) -> List[Tuple[int, str]]:
+    """Rasterize a page range to grayscale PNGs in output_folder
+    
+    Returns (page_number, image_path) in page order; pages that fail to render are
+    logged and skipped.
+    """
+    try:
+        # pypdfium2 ships with pdfplumber and renders in-process instead of
+        # piping each page out of poppler's pdftoppm
+        import pypdfium2 as pdfium
+    except ImportError:
+        return _render_pages_poppler(pdf_path, dpi, output_folder, thread_count, first_page, last_page)
+    
+    rendered = []
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        last_page = min(last_page or len(pdf), len(pdf))
+        for page_num in range(first_page, last_page + 1):
+            page = bitmap = None
+            try:
+                page = pdf[page_num - 1]
+                bitmap = page.render(scale=dpi / 72, grayscale=True)
+                image_path = os.path.join(output_folder, f"page_{page_num:04d}.png")
+                bitmap.to_pil().save(image_path)
+                rendered.append((page_num, image_path))
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to render page {page_num}: {e}")
+            finally:
+                # Free the native page and pixel buffer now rather than at garbage collection
+                if bitmap is not None:
+                    bitmap.close()
+                if page is not None:
+                    page.close()
+    finally:
+        pdf.close()
+    return rendered
+
+def _render_pages_poppler(pdf_path: str, dpi: int, output_folder: str, thread_count: int,
+                          first_page: int, last_page: int = None) -> List[Tuple[int, str]]:
+    """pdf2image fallback for _render_pages, retrying page by page if the range fails"""
+    from pdf2image import convert_from_path
+    
+    def convert(first, last, threads):
+        return convert_from_path(
+            pdf_path, dpi=dpi, poppler_path=POPPLER_PATH,
+            output_folder=output_folder, fmt='png', paths_only=True,
+            first_page=first, last_page=last,
+            thread_count=max(1, threads), grayscale=True
+        )
+    
+    try:
+        return list(enumerate(convert(first_page, last_page, thread_count), first_page))
+    except Exception as e:
+        if last_page is not None and last_page == first_page:
+            logger.warning(f"⚠️ Failed to render page {first_page}: {e}")
+            return []
+        logger.warning(f"⚠️ Failed to render pages {first_page}-{last_page or 'end'}, retrying page by page: {e}")
+    
+    if last_page is None:
+        from pdf2image import pdfinfo_from_path
+        last_page = pdfinfo_from_path(pdf_path, poppler_path=POPPLER_PATH)['Pages']
+    rendered = []
+    for page_num in range(first_page, last_page + 1):
+        try:
+            rendered.extend((page_num, path) for path in convert(page_num, page_num, 1))
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to render page {page_num}: {e}")
+    return rendered
+
+def _ocr_page_range(pdf_path: str, first_page: int, last_page: int, dpi: int,
+                    output_folder: str, tesseract_cmd: str, thread_count: int = 1) -> List[Tuple[int, str]]:
+    """Process-pool worker: render a contiguous page range and OCR it"""
+    pages = _render_pages(pdf_path, dpi, output_folder, thread_count, first_page, last_page)
+    if not pages:
+        return []
+    return _ocr_page_batch(pdf_path, pages, dpi, tesseract_cmd)
+
+def _init_ocr_worker() -> None:
+    """Pool initializer: one single-threaded Tesseract per worker scales better than its OpenMP threads"""
+    # Set in the worker only, so the parent (e.g. a long-running Streamlit server)
+    # keeps Tesseract's threading for its own serial OCR runs
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+def _ocr_pages(pdf_path: str, total_pages: int, dpi: int, output_folder: str,
+               tesseract_cmd: str, num_workers: int) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) in page order, fanning page ranges out to worker processes
+    
+    Each worker renders its own pages, so rasterization runs in parallel and
+    overlaps with OCR in the other workers instead of finishing up front.
+    """
+    if total_pages < 1:
+        return
+    
+    # Like text extraction, short documents skip the pool and its startup cost
+    if num_workers > 1 and total_pages >= PARALLEL_MIN_PAGES:
+        chunk_size = -(-total_pages // num_workers)  # ceiling division
+        first_pages = list(range(1, total_pages + 1, chunk_size))
+        last_pages = [min(first + chunk_size - 1, total_pages) for first in first_pages]
+        with ProcessPoolExecutor(max_workers=len(first_pages), mp_context=_POOL_CONTEXT,
+                                 initializer=_init_ocr_worker) as executor:
+            futures = [
+                executor.submit(_ocr_page_range, pdf_path, first, last, dpi, output_folder, tesseract_cmd)
+                for first, last in zip(first_pages, last_pages)
+            ]
+            for first, last, future in zip(first_pages, last_pages, futures):
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    logger.warning(f"⚠️ OCR failed on pages {first}-{last}: {e}")
+        return
+    
+    try:
+        # Without worker processes, let poppler (when it is the renderer) spread
+        # rasterization over several threads instead
+        page_texts = _ocr_page_range(pdf_path, 1, total_pages, dpi, output_folder, tesseract_cmd,
+                                     min(os.cpu_count() or 1, 8))
+    except Exception as e:
+        logger.warning(f"⚠️ OCR failed: {e}")
+        return
+    yield from page_texts
+
+def extract_text_ocr_enhanced(pdf_path: str, num_workers: int = NUM_WORKERS, total_pages: int = None,
+                              dpi: int = OCR_DPI) -> Dict[str, Any]:
+    """Enhanced OCR extraction with better accuracy (total_pages skips reopening the PDF to count pages)"""
     if not setup_tesseract():
         logger.error("❌ Tesseract not available. Cannot perform OCR.")
         return {'tables': [], 'text': [], 'pages': []}
     
+    import pytesseract
+    
     logger.info("🖼️ Extracting text using enhanced OCR...")
     
     all_text = []
     page_info = []
     
     try:
-        # Convert PDF to images with higher DPI for better accuracy
-        logger.info("🔄 Converting PDF to images...")
-        images = convert_from_path(pdf_path, dpi=OCR_DPI + 100, poppler_path=POPPLER_PATH)  # Higher DPI for better accuracy
+        if total_pages is None:
+            with pdfplumber.open(pdf_path) as pdf:
+                total_pages = len(pdf.pages)
         
-        for page_num, img in enumerate(images, 1):
-            logger.info(f"🔄 Processing page {page_num}/{len(images)} with OCR...")
-            
-            page_data = {
-                'page_number': page_num,
-                'tables': [],
-                'text_lines': [],
-                'has_content': False
-            }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Render pages to disk at dpi (low-confidence pages are re-rendered
+            # sharper); workers load their own page images instead of every page
+            # being held in memory
+            logger.info("🔄 Converting PDF to images...")
+            tesseract_cmd = pytesseract.pytesseract.tesseract_cmd
             
-            try:
-                # Preprocess image for better OCR
-                gray = img.convert("L")
-                
-                # Use multiple OCR configurations for better results
-                ocr_configs = [
-                    "--psm 6",  # Uniform block of text
-                    "--psm 3",  # Fully automatic page segmentation
-                    "--psm 4"   # Assume a single column of text
-                ]
+            for page_num, best_text in _ocr_pages(pdf_path, total_pages, dpi, temp_dir,
+                                                  tesseract_cmd, num_workers):
+                logger.info(f"🔄 Processing page {page_num}/{total_pages} with OCR...")
                 
-                best_text = ""
-                for config in ocr_configs:
-                    try:
-                        text = pytesseract.image_to_string(gray, config=config)
-                        if len(text.strip()) > len(best_text.strip()):
-                            best_text = text
-                    except:
-                        continue
+                page_data = {
+                    'page_number': page_num,
+                    'tables': [],
+                    'text_lines': [],
+                    'has_content': False
+                }
                 
                 if best_text:
-                    lines = best_text.split('\n')
-                    for line_idx, line in enumerate(lines, 1):
-                        line = line.strip()
-                        if line and len(line) >= MIN_LINE_LENGTH:
-                            text_info = {
-                                'page': page_num,
-                                'line_number': line_idx,
-                                'content': line,
-                                'type': 'ocr_text'
-                            }
-                            all_text.append(text_info)
-                            page_data['text_lines'].append(text_info)
-                            page_data['has_content'] = True
+                    # Strip each line once and keep its position in the OCR output
+                    stripped_lines = [line.strip() for line in best_text.split('\n')]
+                    page_data['text_lines'] = [
+                        {'page': page_num, 'line_number': line_idx, 'content': line, 'type': 'ocr_text'}
+                        for line_idx, line in enumerate(stripped_lines, 1)
+                        if line and len(line) >= MIN_LINE_LENGTH
+                    ]
+                    all_text.extend(page_data['text_lines'])
+                    page_data['has_content'] = bool(page_data['text_lines'])
                     
-                    logger.info(f"✅ Extracted {len([l for l in lines if l.strip()])} lines from page {page_num}")
+                    logger.info(f"✅ Extracted {sum(1 for line in stripped_lines if line)} lines from page {page_num}")
                 else:
                     logger.warning(f"⚠️ No text extracted from page {page_num}")
-                    
-            except Exception as e:
-                logger.warning(f"⚠️ OCR failed on page {page_num}: {e}")
-                continue
-            
-            page_info.append(page_data)
+                
+                page_info.append(page_data)
         
         if not all_text:
             logger.warning("⚠️ No content extracted with OCR")
@@ -329,58 +740,145 @@ def extract_text_ocr_enhanced(pdf_path: str) -> Dict[str, Any]:
         logger.error(f"❌ Error extracting with OCR: {e}")
         return {'tables': [], 'text': [], 'pages': []}
 
-def create_enhanced_excel_output(content_data: Dict[str, Any], excel_path: str) -> bool:
+def _select_excel_engine() -> Tuple[str, Dict[str, Any]]:
+    """Pick the Excel engine, streaming through xlsxwriter when installed"""
+    try:
+        import xlsxwriter  # noqa: F401
+        # Extracted text is data: never turn "=..." into formulas or URLs into links
+        return 'xlsxwriter', {'options': {
+            'constant_memory': True, 'nan_inf_to_errors': True,
+            'strings_to_formulas': False, 'strings_to_urls': False
+        }}
+    except ImportError:
+        logger.warning("⚠️ xlsxwriter not installed, writing output with openpyxl")
+    return 'openpyxl', {}
+
+# Excel's per-sheet limits; rows past the last one continue on Sheet_2, Sheet_3, ...
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLS = 16384
+
+def _write_rows(writer, sheet_name: str, rows: Iterator[list], header: List[str] = None,
+                title_rows: frozenset = frozenset()) -> int:
+    """Write rows one at a time under an optional header, returning the number of rows written
+    
+    Nothing is dropped at Excel's sheet limits: once a sheet is full the rows continue
+    on sheet_name_2, sheet_name_3, ... (each repeating the header), and a row wider
+    than Excel allows fails the write instead of being cut off. title_rows holds the
+    indexes of rows to show in bold.
+    """
+    if writer.engine == 'xlsxwriter':
+        header_format = writer.book.add_format({'bold': True, 'border': 1})
+        title_format = writer.book.add_format({'bold': True})
+    else:
+        from openpyxl.styles import Border, Font, Side
+        thin = Side(style='thin')
+        header_font, header_border = Font(bold=True), Border(left=thin, right=thin, top=thin, bottom=thin)
+    
+    def add_sheet(part: int):
+        name = sheet_name if part == 1 else f"{sheet_name}_{part}"
+        if writer.engine == 'xlsxwriter':
+            worksheet = writer.book.add_worksheet(name)
+            if header:
+                worksheet.write_row(0, 0, header, header_format)
+            return worksheet
+        worksheet = writer.book.create_sheet(name)
+        if header:
+            worksheet.append(header)
+            for cell in worksheet[1]:
+                cell.font = header_font
+                cell.border = header_border
+        return worksheet
+    
+    first_row = 1 if header else 0
+    part = 1
+    worksheet = add_sheet(part)
+    sheet_row = first_row
+    row_count = 0
+    for row_idx, row in enumerate(rows):
+        if len(row) > EXCEL_MAX_COLS:
+            raise ValueError(f"Row {row_idx + 1} for '{sheet_name}' has {len(row)} columns; "
+                             f"Excel allows at most {EXCEL_MAX_COLS}")
+        if sheet_row == EXCEL_MAX_ROWS:
+            part += 1
+            worksheet = add_sheet(part)
+            sheet_row = first_row
+        
+        if writer.engine == 'xlsxwriter':
+            # constant_memory keeps only the current row in RAM, so cells must be
+            # written row-major; rows are consumed straight from the iterator
+            worksheet.write_row(sheet_row, 0, row, title_format if row_idx in title_rows else None)
+        else:
+            worksheet.append(row)
+            if row_idx in title_rows:
+                worksheet.cell(row=sheet_row + 1, column=1).font = header_font
+        sheet_row += 1
+        row_count += 1
+    
+    if part > 1:
+        logger.warning(f"⚠️ '{sheet_name}' exceeded Excel's {EXCEL_MAX_ROWS} row limit; "
+                       f"continued on {part - 1} more sheet(s)")
+    return row_count
+
+def _write_sheet(writer, sheet_name: str, columns: List[str], rows: Iterator[tuple]) -> int:
+    """Write a header row and then rows one at a time, returning the number of data rows"""
+    return _write_rows(writer, sheet_name, rows, header=columns)
+
+def _write_tables_sheet(writer, tables: List[Dict[str, Any]], sheet_name: str) -> None:
+    """Stack every table on one sheet, each under a bold title row and followed by a blank row"""
+    # One worksheet for every table keeps the workbook small and avoids
+    # sheet-name limits on table-heavy documents
+    rows = []
+    title_rows = set()
+    for table_idx, table_info in enumerate(tables):
+        title_rows.add(len(rows))
+        rows.append([f"Table {table_idx + 1} (Page {table_info['page']})"])
+        rows.extend(table_info['data'])
+        rows.append([])
+    
+    _write_rows(writer, sheet_name, rows, title_rows=frozenset(title_rows))
+
+def create_enhanced_excel_output(content_data: Dict[str, Any], excel_path: Union[str, BinaryIO],
+                                 include_summary: bool = True) -> bool:
     """Create enhanced Excel output with multiple sheets and preserved structure"""
     try:
-        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+        engine, engine_kwargs = _select_excel_engine()
+        
+        with pd.ExcelWriter(excel_path, engine=engine, engine_kwargs=engine_kwargs) as writer:
+            
+            # Rows are generated from the extracted records as each sheet is written,
+            # so no per-sheet DataFrame or column copy of the content is built
+            text_items = content_data['text']
             
             # Sheet 1: All Text Content (Preserved)
-            if content_data['text']:
-                text_df = pd.DataFrame(content_data['text'])
-                text_df.to_excel(writer, sheet_name='All_Text_Content', index=False)
-                logger.info(f"📝 Saved {len(text_df)} text lines to 'All_Text_Content' sheet")
+            if text_items:
+                row_count = _write_sheet(
+                    writer, 'All_Text_Content', ['page', 'line_number', 'content', 'type'],
+                    ((item['page'], item['line_number'], item['content'], item['type']) for item in text_items)
+                )
+                logger.info(f"📝 Saved {row_count} text lines to 'All_Text_Content' sheet")
             
             # Sheet 2: Tables (Preserved Structure)
             if content_data['tables']:
-                for table_idx, table_info in enumerate(content_data['tables']):
-                    table_df = pd.DataFrame(table_info['data'])
-                    sheet_name = f'Table_{table_info["page"]}_{table_idx + 1}'
-                    # Truncate sheet name if too long
-                    if len(sheet_name) > 31:
-                        sheet_name = sheet_name[:31]
-                    table_df.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
-                    logger.info(f"📊 Saved table {table_idx + 1} from page {table_info['page']}")
+                _write_tables_sheet(writer, content_data['tables'], 'All_Tables')
+                logger.info(f"📊 Saved {len(content_data['tables'])} tables to 'All_Tables' sheet")
             
             # Sheet 3: Page Summary
-            page_summary = []
-            for page_data in content_data['pages']:
-                if page_data['has_content']:
-                    page_summary.append({
-                        'Page_Number': page_data['page_number'],
-                        'Tables_Found': len(page_data['tables']),
-                        'Text_Lines': len(page_data['text_lines']),
-                        'Total_Content_Items': len(page_data['tables']) + len(page_data['text_lines'])
-                    })
-            
-            if page_summary:
-                summary_df = pd.DataFrame(page_summary)
-                summary_df.to_excel(writer, sheet_name='Page_Summary', index=False)
-                logger.info(f"📋 Saved page summary for {len(page_summary)} pages")
-            
-            # Sheet 4: Raw Data (for debugging)
-            raw_data = []
-            for text_item in content_data['text']:
-                raw_data.append({
-                    'Page': text_item['page'],
-                    'Line_Number': text_item['line_number'],
-                    'Content': text_item['content'],
-                    'Type': text_item['type']
-                })
+            if include_summary and any(page_data['has_content'] for page_data in content_data['pages']):
+                row_count = _write_sheet(
+                    writer, 'Page_Summary', ['Page_Number', 'Tables_Found', 'Text_Lines', 'Total_Content_Items'],
+                    ((page_data['page_number'], len(page_data['tables']), len(page_data['text_lines']),
+                      len(page_data['tables']) + len(page_data['text_lines']))
+                     for page_data in content_data['pages'] if page_data['has_content'])
+                )
+                logger.info(f"📋 Saved page summary for {row_count} pages")
             
-            if raw_data:
-                raw_df = pd.DataFrame(raw_data)
-                raw_df.to_excel(writer, sheet_name='Raw_Data', index=False)
-                logger.info(f"🔍 Saved {len(raw_df)} raw data items")
+            # Sheet 4: Raw Data (for debugging); same rows as All_Text_Content
+            if text_items and INCLUDE_RAW_DATA_SHEET:
+                row_count = _write_sheet(
+                    writer, 'Raw_Data', ['Page', 'Line_Number', 'Content', 'Type'],
+                    ((item['page'], item['line_number'], item['content'], item['type']) for item in text_items)
+                )
+                logger.info(f"🔍 Saved {row_count} raw data items")
         
         return True
         
@@ -388,8 +886,15 @@ def create_enhanced_excel_output(content_data: Dict[str, Any], excel_path: str)
         logger.error(f"❌ Error creating Excel file: {e}")
         return False
 
-def enhanced_pdf_to_excel(pdf_path: str, excel_output_path: str) -> bool:
-    """Enhanced main function for PDF to Excel conversion"""
+def enhanced_pdf_to_excel(pdf_path: str, excel_output_path: Union[str, BinaryIO], num_workers: int = NUM_WORKERS,
+                          include_tables: bool = True, include_summary: bool = True,
+                          ocr_dpi: int = OCR_DPI) -> bool:
+    """Enhanced main function for PDF to Excel conversion (output may be a path or a binary buffer)
+    
+    include_tables=False skips table detection on text-based PDFs (no All_Tables sheet),
+    include_summary=False leaves out the Page_Summary sheet, and ocr_dpi sets the
+    render resolution for image-based PDFs.
+    """
     logger.info(f"🔍 Processing file: {pdf_path}")
     
     # Check if input file exists
@@ -397,25 +902,37 @@ def enhanced_pdf_to_excel(pdf_path: str, excel_output_path: str) -> bool:
         logger.error(f"❌ Error: File not found - {pdf_path}")
         return False
     
-    # Check if output directory exists
-    output_dir = os.path.dirname(excel_output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        logger.info(f"📁 Created output directory: {output_dir}")
+    # Check if output directory exists; buffers (e.g. BytesIO) need no directory
+    if isinstance(excel_output_path, str):
+        output_name = excel_output_path
+        output_dir = os.path.dirname(excel_output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+            logger.info(f"📁 Created output directory: {output_dir}")
+    else:
+        output_name = "in-memory workbook"
     
     try:
-        # Determine PDF type and extract content
-        if is_text_based(pdf_path):
-            logger.info("📄 Text-based PDF detected. Using enhanced pdfplumber...")
-            content_data = extract_content_pdfplumber_enhanced(pdf_path)
-            
-            # If pdfplumber fails, try OCR as fallback
-            if not content_data['text'] and not content_data['tables']:
-                logger.warning("⚠️ pdfplumber failed, trying OCR as fallback...")
-                content_data = extract_text_ocr_enhanced(pdf_path)
-        else:
+        # Determine PDF type and extract content, sharing one pdfplumber handle
+        # so the document is only parsed once on the text-based path
+        content_data = None
+        total_pages = None
+        try:
+            with pdfplumber.open(pdf_path) as pdf:
+                total_pages = len(pdf.pages)
+                if has_extractable_text(pdf):
+                    logger.info("📄 Text-based PDF detected. Using enhanced pdfplumber...")
+                    content_data = extract_content_from_pdf(pdf, pdf_path, num_workers, include_tables)
+        except Exception as e:
+            logger.error(f"Error checking PDF type: {e}")
+        
+        if content_data is None:
             logger.info("🖼️ Image-based PDF detected. Using enhanced OCR...")
-            content_data = extract_text_ocr_enhanced(pdf_path)
+            content_data = extract_text_ocr_enhanced(pdf_path, num_workers, total_pages, ocr_dpi)
+        elif not content_data['text'] and not content_data['tables']:
+            # If pdfplumber fails, try OCR as fallback
+            logger.warning("⚠️ pdfplumber failed, trying OCR as fallback...")
+            content_data = extract_text_ocr_enhanced(pdf_path, num_workers, total_pages, ocr_dpi)
         
         # Check if we got any data
         total_items = len(content_data['text']) + len(content_data['tables'])
@@ -424,13 +941,13 @@ def enhanced_pdf_to_excel(pdf_path: str, excel_output_path: str) -> bool:
             return False
         
         # Create enhanced Excel output
-        logger.info(f"💾 Saving to Excel: {excel_output_path}")
-        success = create_enhanced_excel_output(content_data, excel_output_path)
+        logger.info(f"💾 Saving to Excel: {output_name}")
+        success = create_enhanced_excel_output(content_data, excel_output_path, include_summary)
         
         if success:
             logger.info(f"✅ Successfully converted PDF to Excel!")
             logger.info(f"📊 Extracted {len(content_data['text'])} text lines and {len(content_data['tables'])} tables")
-            logger.info(f"📁 Output file: {excel_output_path}")
+            logger.info(f"📁 Output file: {output_name}")
             return True
         else:
             logger.error("❌ Failed to create Excel file")
@@ -5,11 +5,14 @@ Streamlit interface for uploading PDF files and downloading Excel output.
 """
 
 import streamlit as st
+import hashlib
+import html
+import io
 import os
 import tempfile
 from enhanced_pdf_converter import enhanced_pdf_to_excel
-import pandas as pd
-from datetime import datetime
+
+MIB = 1 << 20  # Bytes per MB as shown in the UI
 
 # Page configuration
 st.set_page_config(
@@ -52,6 +55,57 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Feature boxes shown beside the uploader: (title, description)
+FEATURES = [
+    ("🔍 Smart Detection", "Automatically detects text-based vs image-based PDFs"),
+    ("📄 Full Data Preservation", "No text truncation or data loss"),
+    ("📊 Table Structure", "Preserves original table formatting and columns"),
+    ("🖼️ Advanced OCR", "Multiple OCR configurations for best accuracy"),
+    ("📋 Multiple Sheets", "Organized Excel output with separate sheets"),
+]
+
+@st.cache_resource
+def load_config_module():
+    """Import config_standalone once per server, returning None when it is missing"""
+    # Reruns would otherwise repeat the import attempt (and the sys.path scan
+    # when it fails) on every widget interaction
+    try:
+        import config_standalone
+        return config_standalone
+    except ImportError:
+        return None
+
+class ConversionFailed(Exception):
+    """Raised when the converter reports failure for an uploaded PDF"""
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def convert_pdf_bytes(pdf_hash: str, _pdf_bytes: bytes, preserve_tables: bool = True,
+                      include_summary: bool = True, ocr_dpi: int = 300) -> bytes:
+    """Convert PDF bytes to Excel bytes (cached by the content hash and output options)"""
+    # Streamlit reruns the script on every interaction; caching on the PDF
+    # hash means re-clicking Convert for the same file skips extraction/OCR.
+    # The leading underscore keeps Streamlit from hashing the bytes itself.
+    # Failures raise, so they are not cached and a retry converts again.
+    # Bounded so a long-lived server doesn't keep every workbook in memory.
+    
+    # The PDF still needs a path (worker processes and OCR reopen it by name);
+    # the workbook is written straight into memory instead of a temp .xlsx
+    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+    try:
+        # Closed before converting so other processes can open it on Windows
+        with tmp_file:
+            tmp_file.write(_pdf_bytes)
+        
+        excel_buffer = io.BytesIO()
+        if not enhanced_pdf_to_excel(tmp_file.name, excel_buffer,
+                                     include_tables=preserve_tables, include_summary=include_summary,
+                                     ocr_dpi=ocr_dpi):
+            raise ConversionFailed()
+        return excel_buffer.getvalue()
+    finally:
+        # Single cleanup path, also covering a failed write
+        os.unlink(tmp_file.name)
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">🔧 Enhanced PDF to Excel Converter</h1>', unsafe_allow_html=True)
@@ -61,32 +115,36 @@ def main():
     with st.sidebar:
         st.header("⚙️ Configuration")
         
-        # OCR Settings
-        st.subheader("OCR Settings")
-        ocr_dpi = st.slider("OCR DPI", min_value=200, max_value=600, value=300, step=50,
-                           help="Higher DPI = better quality but slower processing")
-        
-        # Processing Options
-        st.subheader("Processing Options")
-        preserve_tables = st.checkbox("Preserve Table Structure", value=True,
-                                    help="Maintain original table formatting")
-        
-        include_summary = st.checkbox("Include Page Summary", value=True,
-                                    help="Add summary sheet with page statistics")
-        
-        # File Upload Settings
-        st.subheader("File Settings")
-        max_file_size = st.number_input("Max File Size (MB)", min_value=1, max_value=100, value=50)
+        # Settings live in a form so adjusting them doesn't rerun the app
+        # until they are applied
+        with st.form("settings"):
+            # OCR Settings
+            st.subheader("OCR Settings")
+            ocr_dpi = st.slider("OCR DPI", min_value=200, max_value=600, value=300, step=50,
+                               help="Higher DPI = better quality but slower processing")
+            
+            # Processing Options
+            st.subheader("Processing Options")
+            preserve_tables = st.checkbox("Preserve Table Structure", value=True,
+                                        help="Maintain original table formatting")
+            
+            include_summary = st.checkbox("Include Page Summary", value=True,
+                                        help="Add summary sheet with page statistics")
+            
+            # File Upload Settings
+            st.subheader("File Settings")
+            max_file_size = st.number_input("Max File Size (MB)", min_value=1, max_value=100, value=50)
+            
+            st.form_submit_button("Apply Settings", use_container_width=True)
         
         st.markdown("---")
         st.markdown("### 📊 Current Status")
         
         # Check dependencies
-        try:
-            from config_standalone import print_configuration_status
+        if load_config_module() is not None:
             with st.expander("🔧 System Configuration"):
                 st.code("Configuration check will be shown here")
-        except:
+        else:
             st.warning("⚠️ Configuration file not found")
     
     # Main content area
@@ -102,114 +160,85 @@ def main():
             help="Upload a PDF file to convert to Excel format"
         )
         
-        if uploaded_file is not None:
-            # Display file information
-            st.markdown('<div class="info-box">', unsafe_allow_html=True)
-            st.write(f"**File Name:** {uploaded_file.name}")
-            st.write(f"**File Size:** {uploaded_file.size / 1024 / 1024:.2f} MB")
-            st.write(f"**File Type:** {uploaded_file.type}")
-            st.markdown('</div>', unsafe_allow_html=True)
+        if uploaded_file is not None and uploaded_file.size > max_file_size * MIB:
+            # Reject before the upload is copied for conversion
+            st.error(f"❌ File is larger than the {max_file_size} MB limit set in the sidebar.")
+        
+        elif uploaded_file is not None:
+            # Display file information (one element; the name is user input, so escape it)
+            st.markdown(
+                f'<div class="info-box">'
+                f'<b>File Name:</b> {html.escape(uploaded_file.name)}<br>'
+                f'<b>File Size:</b> {uploaded_file.size / MIB:.2f} MB<br>'
+                f'<b>File Type:</b> {html.escape(uploaded_file.type)}'
+                f'</div>',
+                unsafe_allow_html=True
+            )
             
             # Conversion options
             st.subheader("🔄 Conversion Options")
             
-            col_a, col_b = st.columns(2)
-            with col_a:
-                output_filename = st.text_input(
-                    "Output Filename",
-                    value=f"{os.path.splitext(uploaded_file.name)[0]}_converted.xlsx",
-                    help="Name for the output Excel file"
-                )
-            
-            with col_b:
-                include_headers = st.checkbox("Include Headers", value=False,
-                                            help="Add column headers to Excel output")
+            # Options are submitted together with the Convert button, so
+            # editing them doesn't trigger a rerun of their own
+            with st.form("conversion"):
+                col_a, col_b = st.columns(2)
+                with col_a:
+                    output_filename = st.text_input(
+                        "Output Filename",
+                        value=f"{os.path.splitext(uploaded_file.name)[0]}_converted.xlsx",
+                        help="Name for the output Excel file"
+                    )
+                
+                with col_b:
+                    include_headers = st.checkbox("Include Headers", value=False,
+                                                help="Add column headers to Excel output")
+                
+                # Convert button
+                convert_clicked = st.form_submit_button("🚀 Convert to Excel", type="primary",
+                                                        use_container_width=True)
             
-            # Convert button
-            if st.button("🚀 Convert to Excel", type="primary", use_container_width=True):
+            if convert_clicked:
                 with st.spinner("🔄 Converting PDF to Excel..."):
                     try:
-                        # Create temporary file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                            tmp_file.write(uploaded_file.getvalue())
-                            tmp_pdf_path = tmp_file.name
+                        # Perform conversion (cached per PDF content across reruns);
+                        # getvalue() copies the upload, so take it once for hash and conversion
+                        pdf_bytes = uploaded_file.getvalue()
+                        pdf_hash = hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+                        excel_data = convert_pdf_bytes(pdf_hash, pdf_bytes,
+                                                       preserve_tables, include_summary, ocr_dpi)
                         
-                        # Create temporary output path
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_output:
-                            tmp_excel_path = tmp_output.name
+                        # Success message
+                        st.markdown('<div class="success-box">', unsafe_allow_html=True)
+                        st.success("✅ Conversion completed successfully!")
+                        st.markdown('</div>', unsafe_allow_html=True)
                         
-                        # Perform conversion
-                        success = enhanced_pdf_to_excel(tmp_pdf_path, tmp_excel_path)
+                        # Download button
+                        st.download_button(
+                            label="📥 Download Excel File",
+                            data=excel_data,
+                            file_name=output_filename,
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            use_container_width=True
+                        )
                         
-                        if success:
-                            # Read the Excel file for download
-                            with open(tmp_excel_path, 'rb') as f:
-                                excel_data = f.read()
-                            
-                            # Clean up temporary files
-                            os.unlink(tmp_pdf_path)
-                            os.unlink(tmp_excel_path)
-                            
-                            # Success message
-                            st.markdown('<div class="success-box">', unsafe_allow_html=True)
-                            st.success("✅ Conversion completed successfully!")
-                            st.markdown('</div>', unsafe_allow_html=True)
-                            
-                            # Download button
-                            st.download_button(
-                                label="📥 Download Excel File",
-                                data=excel_data,
-                                file_name=output_filename,
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                use_container_width=True
-                            )
-                            
-                            # Show file info
-                            st.info(f"📁 File saved as: {output_filename}")
-                            
-                        else:
-                            st.error("❌ Conversion failed. Please check the file and try again.")
-                            # Clean up temporary files
-                            if os.path.exists(tmp_pdf_path):
-                                os.unlink(tmp_pdf_path)
-                            if os.path.exists(tmp_excel_path):
-                                os.unlink(tmp_excel_path)
+                        # Show file info
+                        st.info(f"📁 File saved as: {output_filename}")
+                    
+                    except ConversionFailed:
+                        st.error("❌ Conversion failed. Please check the file and try again.")
                     
                     except Exception as e:
                         st.error(f"❌ Error during conversion: {str(e)}")
-                        # Clean up temporary files
-                        if 'tmp_pdf_path' in locals() and os.path.exists(tmp_pdf_path):
-                            os.unlink(tmp_pdf_path)
-                        if 'tmp_excel_path' in locals() and os.path.exists(tmp_excel_path):
-                            os.unlink(tmp_excel_path)
     
     with col2:
         st.header("📋 Features")
         
-        st.markdown('<div class="feature-box">', unsafe_allow_html=True)
-        st.write("🔍 **Smart Detection**")
-        st.write("Automatically detects text-based vs image-based PDFs")
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown('<div class="feature-box">', unsafe_allow_html=True)
-        st.write("📄 **Full Data Preservation**")
-        st.write("No text truncation or data loss")
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown('<div class="feature-box">', unsafe_allow_html=True)
-        st.write("📊 **Table Structure**")
-        st.write("Preserves original table formatting and columns")
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown('<div class="feature-box">', unsafe_allow_html=True)
-        st.write("🖼️ **Advanced OCR**")
-        st.write("Multiple OCR configurations for best accuracy")
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown('<div class="feature-box">', unsafe_allow_html=True)
-        st.write("📋 **Multiple Sheets**")
-        st.write("Organized Excel output with separate sheets")
-        st.markdown('</div>', unsafe_allow_html=True)
+        # All boxes go out as one element instead of four calls per box
+        st.markdown(
+            "".join(f'<div class="feature-box"><b>{title}</b><br>{description}</div>'
+                    for title, description in FEATURES),
+            unsafe_allow_html=True
+        )
     
     # Footer
     st.markdown("---")